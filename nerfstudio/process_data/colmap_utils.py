@@ -35,22 +35,28 @@ https://github.com/colmap/colmap/blob/1a4d0bad2e90aa65ce997c9d1779518eaed998d5/s
 #
 # Author: Johannes L. Schoenberger (jsch-at-demuc-dot-de)
 
-import json
+import hashlib
 import os
+import shlex
+import shutil
 import struct
+import tempfile
 from dataclasses import dataclass
+from functools import lru_cache, partial
 from io import BufferedReader
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import appdirs
 import numpy as np
+import orjson
 import requests
 from rich.console import Console
-from rich.progress import track
+from rich.progress import wrap_file
+from scipy.spatial.transform import Rotation
 from typing_extensions import Literal
 
-from nerfstudio.process_data.process_data_utils import CameraModel
+from nerfstudio.process_data.process_data_utils import CameraModel, list_images
 from nerfstudio.utils.rich_utils import status
 from nerfstudio.utils.scripts import run_command
 
@@ -140,17 +146,41 @@ COLMAP_CAMERA_MODEL_IDS = {camera_model.model_id: camera_model for camera_model
 COLMAP_CAMERA_MODEL_NAMES = {camera_model.model_name: camera_model for camera_model in COLMAP_CAMERA_MODELS}
 
 
-def get_colmap_version(colmap_cmd: str, default_version=3.8) -> float:
+def get_colmap_argv(colmap_cmd: str) -> List[str]:
+    """Splits the command used to call COLMAP into an argument list that runs without a shell.
+
+    On Windows the command is split without POSIX escaping so backslashes in paths survive, and the executable is
+    resolved with shutil.which so a bare "colmap" still finds COLMAP.bat through PATHEXT.
+
+    Args:
+        colmap_cmd: How to call the COLMAP executable.
+    Returns:
+        The COLMAP command as an argument list.
+    """
+    colmap_argv = shlex.split(colmap_cmd, posix=os.name != "nt")
+    if os.name == "nt":
+        # Non-POSIX splitting keeps the quotes around quoted arguments.
+        colmap_argv = [arg[1:-1] if len(arg) > 1 and arg[0] == arg[-1] == '"' else arg for arg in colmap_argv]
+    executable = shutil.which(colmap_argv[0])
+    if executable is not None:
+        colmap_argv[0] = executable
+    return colmap_argv
+
+
+@lru_cache(maxsize=4)
+def get_colmap_version(colmap_cmd: str, default_version: float = 3.8) -> float:
     """Returns the version of COLMAP.
     This code assumes that colmap returns a version string of the form
     "COLMAP 3.8 ..." which may not be true for all versions of COLMAP.
+    The result is cached per COLMAP command since it requires spawning COLMAP.
 
     Args:
+        colmap_cmd: Path to the COLMAP executable.
         default_version: Default version to return if COLMAP version can't be determined.
     Returns:
         The version of COLMAP.
     """
-    output = run_command(colmap_cmd, verbose=False)
+    output = run_command(get_colmap_argv(colmap_cmd), verbose=False)
     assert output is not None
     for line in output.split("\n"):
         if line.startswith("COLMAP"):
@@ -474,20 +504,86 @@ def get_vocab_tree() -> Path:
     if not vocab_tree_filename.exists():
         r = requests.get("https://demuc.de/colmap/vocab_tree_flickr100K_words32K.bin", stream=True)
         vocab_tree_filename.parent.mkdir(parents=True, exist_ok=True)
-        with open(vocab_tree_filename, "wb") as f:
-            total_length = r.headers.get("content-length")
-            assert total_length is not None
-            for chunk in track(
-                r.iter_content(chunk_size=1024),
-                total=int(total_length) / 1024 + 1,
-                description="Downloading vocab tree...",
-            ):
-                if chunk:
-                    f.write(chunk)
-                    f.flush()
+        total_length = r.headers.get("content-length")
+        assert total_length is not None
+        r.raw.decode_content = True
+        with open(vocab_tree_filename, "wb") as f, wrap_file(
+            r.raw, total=int(total_length), description="Downloading vocab tree..."
+        ) as raw:
+            shutil.copyfileobj(raw, f, length=1024 * 1024)
     return vocab_tree_filename
 
 
+def get_colmap_cache_dir(
+    image_dir: Path,
+    camera_model: CameraModel,
+    matching_method: str,
+    camera_mask_path: Optional[Path] = None,
+) -> Path:
+    """Returns the directory that caches COLMAP's sparse reconstruction for the given inputs.
+
+    The directory name hashes the names and contents of the images and camera mask together with the COLMAP settings
+    that change the reconstruction.
+
+    Args:
+        image_dir: Path to the directory containing the images.
+        camera_model: Camera model to use.
+        matching_method: Matching method to use.
+        camera_mask_path: Path to the camera mask.
+
+    Returns:
+        The cache directory. It only contains a reconstruction if a previous run finished.
+    """
+    hasher = hashlib.sha256(f"{camera_model.value}:{matching_method}".encode("utf-8"))
+    input_paths = list_images(image_dir)
+    if camera_mask_path is not None:
+        input_paths.append(camera_mask_path)
+    for input_path in input_paths:
+        hasher.update(f"{input_path.name}:{input_path.stat().st_size}:".encode("utf-8"))
+        with open(input_path, "rb") as f:
+            for chunk in iter(partial(f.read, 1024 * 1024), b""):
+                hasher.update(chunk)
+    return Path(appdirs.user_cache_dir("nerfstudio")) / "colmap" / hasher.hexdigest()
+
+
+def _is_complete_colmap_model(model_dir: Path) -> bool:
+    """Checks that a COLMAP model directory contains all the files of a sparse reconstruction.
+
+    Args:
+        model_dir: Path to the model directory, e.g. sparse/0.
+    Returns:
+        True if cameras.bin, images.bin and points3D.bin all exist.
+    """
+    return all((model_dir / filename).exists() for filename in ("cameras.bin", "images.bin", "points3D.bin"))
+
+
+def _store_in_colmap_cache(sparse_dir: Path, cache_dir: Path) -> None:
+    """Copies a sparse reconstruction into the COLMAP cache.
+
+    The files are copied into a temporary sibling directory that is then renamed into place, so an interrupted or
+    concurrent run never leaves a partial model under the cache key. Results are copied rather than linked, so the
+    output directory stays valid if the cache is cleared.
+
+    Args:
+        sparse_dir: Path to COLMAP's sparse output directory.
+        cache_dir: Cache directory for this reconstruction.
+    """
+    cache_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{cache_dir.name}-", dir=cache_dir.parent))
+    try:
+        shutil.copytree(sparse_dir, tmp_dir / "sparse")
+        if cache_dir.exists() and not _is_complete_colmap_model(cache_dir / "0"):
+            # Left over from a run that predates atomic writes or was otherwise damaged.
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir / "sparse", cache_dir)
+        except OSError:
+            # Another run cached the same reconstruction first.
+            pass
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
 def run_colmap(
     image_dir: Path,
     colmap_dir: Path,
@@ -497,6 +593,7 @@ def run_colmap(
     verbose: bool = False,
     matching_method: Literal["vocab_tree", "exhaustive", "sequential"] = "vocab_tree",
     colmap_cmd: str = "colmap",
+    use_cache: bool = False,
 ) -> None:
     """Runs COLMAP on the images.
 
@@ -509,8 +606,20 @@ def run_colmap(
         verbose: If True, logs the output of the command.
         matching_method: Matching method to use.
         colmap_cmd: Path to the COLMAP executable.
+        use_cache: If True, reuses the sparse reconstruction of a previous run on identical images and settings, and
+            caches the result of a new run.
     """
 
+    sparse_dir = colmap_dir / "sparse"
+    cache_dir: Optional[Path] = None
+    if use_cache:
+        cache_dir = get_colmap_cache_dir(image_dir, camera_model, matching_method, camera_mask_path)
+        if _is_complete_colmap_model(cache_dir / "0"):
+            shutil.rmtree(sparse_dir, ignore_errors=True)
+            shutil.copytree(cache_dir, sparse_dir)
+            CONSOLE.log(f"[bold green]:tada: Reused cached COLMAP reconstruction from {cache_dir}.")
+            return
+
     colmap_version = get_colmap_version(colmap_cmd)
 
     colmap_database_path = colmap_dir / "database.db"
@@ -518,18 +627,26 @@ def run_colmap(
         # Can't use missing_ok argument because of Python 3.7 compatibility.
         colmap_database_path.unlink()
 
+    # Commands are passed to run_command as argument lists so they don't go through a shell.
+    colmap_argv = get_colmap_argv(colmap_cmd)
+
     # Feature extraction
     feature_extractor_cmd = [
-        f"{colmap_cmd} feature_extractor",
-        f"--database_path {colmap_dir / 'database.db'}",
-        f"--image_path {image_dir}",
-        "--ImageReader.single_camera 1",
-        f"--ImageReader.camera_model {camera_model.value}",
-        f"--SiftExtraction.use_gpu {int(gpu)}",
+        *colmap_argv,
+        "feature_extractor",
+        "--database_path",
+        str(colmap_dir / "database.db"),
+        "--image_path",
+        str(image_dir),
+        "--ImageReader.single_camera",
+        "1",
+        "--ImageReader.camera_model",
+        camera_model.value,
+        "--SiftExtraction.use_gpu",
+        str(int(gpu)),
     ]
     if camera_mask_path is not None:
-        feature_extractor_cmd.append(f"--ImageReader.camera_mask_path {camera_mask_path}")
-    feature_extractor_cmd = " ".join(feature_extractor_cmd)
+        feature_extractor_cmd.extend(["--ImageReader.camera_mask_path", str(camera_mask_path)])
     with status(msg="[bold yellow]Running COLMAP feature extractor...", spinner="moon", verbose=verbose):
         run_command(feature_extractor_cmd, verbose=verbose)
 
@@ -537,31 +654,34 @@ def run_colmap(
 
     # Feature matching
     feature_matcher_cmd = [
-        f"{colmap_cmd} {matching_method}_matcher",
-        f"--database_path {colmap_dir / 'database.db'}",
-        f"--SiftMatching.use_gpu {int(gpu)}",
+        *colmap_argv,
+        f"{matching_method}_matcher",
+        "--database_path",
+        str(colmap_dir / "database.db"),
+        "--SiftMatching.use_gpu",
+        str(int(gpu)),
     ]
     if matching_method == "vocab_tree":
         vocab_tree_filename = get_vocab_tree()
-        feature_matcher_cmd.append(f"--VocabTreeMatching.vocab_tree_path {vocab_tree_filename}")
-    feature_matcher_cmd = " ".join(feature_matcher_cmd)
+        feature_matcher_cmd.extend(["--VocabTreeMatching.vocab_tree_path", str(vocab_tree_filename)])
     with status(msg="[bold yellow]Running COLMAP feature matcher...", spinner="runner", verbose=verbose):
         run_command(feature_matcher_cmd, verbose=verbose)
     CONSOLE.log("[bold green]:tada: Done matching COLMAP features.")
 
     # Bundle adjustment
-    sparse_dir = colmap_dir / "sparse"
     sparse_dir.mkdir(parents=True, exist_ok=True)
     mapper_cmd = [
-        f"{colmap_cmd} mapper",
-        f"--database_path {colmap_dir / 'database.db'}",
-        f"--image_path {image_dir}",
-        f"--output_path {sparse_dir}",
+        *colmap_argv,
+        "mapper",
+        "--database_path",
+        str(colmap_dir / "database.db"),
+        "--image_path",
+        str(image_dir),
+        "--output_path",
+        str(sparse_dir),
     ]
     if colmap_version >= 3.7:
-        mapper_cmd.append("--Mapper.ba_global_function_tolerance 1e-6")
-
-    mapper_cmd = " ".join(mapper_cmd)
+        mapper_cmd.extend(["--Mapper.ba_global_function_tolerance", "1e-6"])
 
     with status(
         msg="[bold yellow]Running COLMAP bundle adjustment... (This may take a while)",
@@ -572,14 +692,21 @@ def run_colmap(
     CONSOLE.log("[bold green]:tada: Done COLMAP bundle adjustment.")
     with status(msg="[bold yellow]Refine intrinsics...", spinner="dqpb", verbose=verbose):
         bundle_adjuster_cmd = [
-            f"{colmap_cmd} bundle_adjuster",
-            f"--input_path {sparse_dir}/0",
-            f"--output_path {sparse_dir}/0",
-            "--BundleAdjustment.refine_principal_point 1",
+            *colmap_argv,
+            "bundle_adjuster",
+            "--input_path",
+            str(sparse_dir / "0"),
+            "--output_path",
+            str(sparse_dir / "0"),
+            "--BundleAdjustment.refine_principal_point",
+            "1",
         ]
-        run_command(" ".join(bundle_adjuster_cmd), verbose=verbose)
+        run_command(bundle_adjuster_cmd, verbose=verbose)
     CONSOLE.log("[bold green]:tada: Done refining intrinsics.")
 
+    if cache_dir is not None:
+        _store_in_colmap_cache(sparse_dir, cache_dir)
+
 
 def colmap_to_json(
     cameras_path: Path,
@@ -607,23 +734,30 @@ def colmap_to_json(
     # Only supports one camera
     camera_params = cameras[1].params
 
-    frames = []
-    for _, im_data in images.items():
-        rotation = qvec2rotmat(im_data.qvec)
-        translation = im_data.tvec.reshape(3, 1)
-        w2c = np.concatenate([rotation, translation], 1)
-        w2c = np.concatenate([w2c, np.array([[0, 0, 0, 1]])], 0)
-        c2w = np.linalg.inv(w2c)
-        # Convert from COLMAP's camera coordinate system to ours
-        c2w[0:3, 1:3] *= -1
-        c2w = c2w[np.array([1, 0, 2, 3]), :]
-        c2w[2, :] *= -1
+    # Convert all poses at once. COLMAP stores quaternions as (w, x, y, z), scipy expects (x, y, z, w). The reshapes
+    # keep the shapes valid when no images were registered, so an empty frame list is written and 0 is returned.
+    qvecs = np.array([im_data.qvec for im_data in images.values()], dtype=np.float64).reshape(-1, 4)
+    tvecs = np.array([im_data.tvec for im_data in images.values()], dtype=np.float64).reshape(-1, 3)
+    w2c = np.zeros((len(images), 4, 4))
+    w2c[:, :3, :3] = Rotation.from_quat(qvecs[:, [1, 2, 3, 0]]).as_matrix()
+    w2c[:, :3, 3] = tvecs
+    w2c[:, 3, 3] = 1
+    c2w = np.linalg.inv(w2c)
+    # Convert from COLMAP's camera coordinate system to ours
+    c2w[:, 0:3, 1:3] *= -1
+    c2w = c2w[:, np.array([1, 0, 2, 3]), :]
+    c2w[:, 2, :] *= -1
+    # orjson only serializes C-contiguous arrays, and the batched inverse doesn't guarantee that layout. The dataparsers
+    # load poses as float32, so write them at that precision to keep transforms.json small.
+    c2w = np.ascontiguousarray(c2w, dtype=np.float32)
 
+    frames = []
+    for im_data, transform_matrix in zip(images.values(), c2w):
         name = Path(f"./images/{im_data.name}")
 
         frame = {
             "file_path": name.as_posix(),
-            "transform_matrix": c2w.tolist(),
+            "transform_matrix": transform_matrix,
         }
         if camera_mask_path is not None:
             frame["mask_path"] = camera_mask_path.relative_to(camera_mask_path.parent.parent).as_posix()
@@ -660,8 +794,9 @@ def colmap_to_json(
 
     out["frames"] = frames
 
-    with open(output_dir / "transforms.json", "w", encoding="utf-8") as f:
-        json.dump(out, f, indent=4)
+    (output_dir / "transforms.json").write_bytes(
+        orjson.dumps(out, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2)
+    )
 
     return len(frames)
 
@@ -14,13 +14,19 @@
 
 """Helper utils for processing insta360 data."""
 
+import concurrent.futures
+import shutil
 import sys
 from pathlib import Path
 from typing import List, Tuple
 
 from rich.console import Console
 
-from nerfstudio.process_data.process_data_utils import get_num_frames_in_video
+from nerfstudio.process_data.process_data_utils import (
+    count_frames,
+    get_num_ffmpeg_workers,
+    get_num_frames_in_video,
+)
 from nerfstudio.utils.rich_utils import status
 from nerfstudio.utils.scripts import run_command
 
@@ -74,19 +80,17 @@ def convert_insta360_to_images(
     """
 
     with status(msg="Converting video to images...", spinner="bouncingBall", verbose=verbose):
-        # delete existing images in folder
-        for img in image_dir.glob("*.png"):
-            if verbose:
-                CONSOLE.log(f"Deleting {img}")
-            img.unlink()
-
-        num_frames_front = get_num_frames_in_video(video_front)
-        num_frames_back = get_num_frames_in_video(video_back)
+        shutil.rmtree(image_dir, ignore_errors=True)
+        image_dir.mkdir(parents=True, exist_ok=True)
+
+        # ffprobe only takes a single input, so probe both videos concurrently instead.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            num_frames_front, num_frames_back = executor.map(get_num_frames_in_video, (video_front, video_back))
         if num_frames_front == 0:
             CONSOLE.print(f"[bold red]Error: Video has no frames: {video_front}")
             sys.exit(1)
         if num_frames_back == 0:
-            CONSOLE.print(f"[bold red]Error: Video has no frames: {video_front}")
+            CONSOLE.print(f"[bold red]Error: Video has no frames: {video_back}")
             sys.exit(1)
 
         spacing = num_frames_front // (num_frames_target // 2)
@@ -101,19 +105,25 @@ def convert_insta360_to_images(
         front_vf_cmds = vf_cmds + ["transpose=2"]
         back_vf_cmds = vf_cmds + ["transpose=1"]
 
-        front_ffmpeg_cmd = f"ffmpeg -i {video_front} -vf {','.join(front_vf_cmds)} -r 1 {image_dir / 'frame_%05d.png'}"
-        back_ffmpeg_cmd = (
-            f"ffmpeg -i {video_back} -vf {','.join(back_vf_cmds)} -r 1 {image_dir / 'back_frame_%05d.png'}"
-        )
-
-        run_command(front_ffmpeg_cmd, verbose=verbose)
-        run_command(back_ffmpeg_cmd, verbose=verbose)
-
-        num_extracted_front_frames = len(list(image_dir.glob("frame*.png")))
-        for i, img in enumerate(image_dir.glob("back_frame_*.png")):
-            img.rename(image_dir / f"frame_{i+1+num_extracted_front_frames:05d}.png")
-
-    num_final_frames = len(list(image_dir.glob("*.png")))
+        # The front and back extractions are independent, so run them concurrently with half the cores each.
+        # -nostdin keeps the two processes from fighting over the terminal settings.
+        num_threads = get_num_ffmpeg_workers()
+        front_ffmpeg_cmd = ["ffmpeg", "-nostdin", "-y", "-i", str(video_front), "-threads", str(num_threads)]
+        front_ffmpeg_cmd += ["-vf", ",".join(front_vf_cmds), "-r", "1", "-q:v", "2", str(image_dir / "frame_%05d.jpg")]
+        back_ffmpeg_cmd = ["ffmpeg", "-nostdin", "-y", "-i", str(video_back), "-threads", str(num_threads)]
+        back_ffmpeg_cmd += ["-vf", ",".join(back_vf_cmds), "-r", "1", "-q:v", "2"]
+        back_ffmpeg_cmd.append(str(image_dir / "back_frame_%05d.jpg"))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(run_command, cmd, verbose) for cmd in (front_ffmpeg_cmd, back_ffmpeg_cmd)]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+
+        # The number of front frames is only known once extraction is done, so the back frames are renamed after.
+        num_extracted_front_frames = count_frames(image_dir)
+        for i, img in enumerate(sorted(image_dir.glob("back_frame_*.jpg"))):
+            img.rename(image_dir / f"frame_{i+1+num_extracted_front_frames:05d}.jpg")
+
+    num_final_frames = count_frames(image_dir)
     summary_log = []
     summary_log.append(f"Starting with {num_frames_front + num_frames_back} video frames")
     summary_log.append(f"We extracted {num_final_frames} images")
@@ -143,11 +153,8 @@ def convert_insta360_single_file_to_images(
     """
 
     with status(msg="Converting video to images...", spinner="bouncingBall", verbose=verbose):
-        # delete existing images in folder
-        for img in image_dir.glob("*.png"):
-            if verbose:
-                CONSOLE.log(f"Deleting {img}")
-            img.unlink()
+        shutil.rmtree(image_dir, ignore_errors=True)
+        image_dir.mkdir(parents=True, exist_ok=True)
 
         num_frames = get_num_frames_in_video(video)
         if num_frames == 0:
@@ -171,17 +178,17 @@ def convert_insta360_single_file_to_images(
             f"crop=ih*{crop_percentage}:ih*{crop_percentage}:iw/2+ih*{crop_percentage/4}:ih*{crop_percentage/4}"
         )
 
-        front_ffmpeg_cmd = f"ffmpeg -i {video} -vf {','.join(vf_cmds_front)} -r 1 {image_dir / 'frame_%05d.png'}"
-        back_ffmpeg_cmd = f"ffmpeg -i {video} -vf {','.join(vf_cmds_back)} -r 1 {image_dir / 'back_frame_%05d.png'}"
-
-        run_command(back_ffmpeg_cmd, verbose=verbose)
+        front_ffmpeg_cmd = ["ffmpeg", "-y", "-i", str(video), "-vf", ",".join(vf_cmds_front), "-r", "1", "-q:v", "2"]
+        front_ffmpeg_cmd.append(str(image_dir / "frame_%05d.jpg"))
         run_command(front_ffmpeg_cmd, verbose=verbose)
 
-        num_extracted_frames = len(list(image_dir.glob("frame*.png")))
-        for i, img in enumerate(image_dir.glob("back_frame_*.png")):
-            img.rename(image_dir / f"frame_{i+1+num_extracted_frames:05d}.png")
+        # Number the back frames after the front frames so they don't need to be renamed.
+        num_extracted_frames = count_frames(image_dir)
+        back_ffmpeg_cmd = ["ffmpeg", "-y", "-i", str(video), "-vf", ",".join(vf_cmds_back), "-r", "1", "-q:v", "2"]
+        back_ffmpeg_cmd += ["-start_number", str(num_extracted_frames + 1), str(image_dir / "frame_%05d.jpg")]
+        run_command(back_ffmpeg_cmd, verbose=verbose)
 
-    num_final_frames = len(list(image_dir.glob("*.png")))
+    num_final_frames = count_frames(image_dir)
     summary_log = []
     summary_log.append(f"Starting with {num_frames} video frames")
     summary_log.append(f"We extracted {num_final_frames} images")
@@ -14,12 +14,13 @@
 
 """Helper utils for processing data into the nerfstudio format."""
 
+import concurrent.futures
 import os
 import shutil
 import sys
 from enum import Enum
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
@@ -31,6 +32,7 @@ from nerfstudio.utils.scripts import run_command
 
 CONSOLE = Console(width=120)
 POLYCAM_UPSCALING_TIMES = 2
+ALLOWED_EXTS = frozenset({".jpg", ".jpeg", ".png", ".tif", ".tiff"})
 
 
 class CameraModel(Enum):
@@ -55,11 +57,36 @@ def list_images(data: Path) -> List[Path]:
     Returns:
         Paths to images contained in the directory
     """
-    allowed_exts = [".jpg", ".jpeg", ".png", ".tif", ".tiff"]
-    image_paths = sorted([p for p in data.glob("[!.]*") if p.suffix.lower() in allowed_exts])
+    with os.scandir(data) as entries:
+        image_paths = sorted(
+            Path(entry.path)
+            for entry in entries
+            if not entry.name.startswith(".") and os.path.splitext(entry.name)[1].lower() in ALLOWED_EXTS
+        )
     return image_paths
 
 
+def get_evenly_spaced_indices(num_items: int, num_samples: int) -> np.ndarray:
+    """Returns indices of num_samples items spread evenly over num_items, including the first and last.
+
+    Same as rounding np.linspace(0, num_items - 1, num_samples), but computed exactly with integer arithmetic, so
+    exact halves round consistently instead of depending on floating point error.
+
+    Args:
+        num_items: Number of items to sample from.
+        num_samples: Number of indices to return.
+    Returns:
+        The sampled indices.
+    """
+    if num_samples == 1:
+        return np.zeros(1, dtype=np.int64)
+    denominator = num_samples - 1
+    quotient, remainder = np.divmod(np.arange(num_samples, dtype=np.int64) * (num_items - 1), denominator)
+    # Round halves to even like np.round.
+    round_up = (2 * remainder > denominator) | ((2 * remainder == denominator) & (quotient % 2 == 1))
+    return quotient + round_up
+
+
 def get_image_filenames(directory: Path, max_num_images: int = -1) -> Tuple[List[Path], int]:
     """Returns a list of image filenames in a directory.
 
@@ -72,16 +99,25 @@ def get_image_filenames(directory: Path, max_num_images: int = -1) -> Tuple[List
     image_paths = list_images(directory)
     num_orig_images = len(image_paths)
 
-    if max_num_images != -1 and num_orig_images > max_num_images:
-        idx = np.round(np.linspace(0, num_orig_images - 1, max_num_images)).astype(int)
-    else:
-        idx = np.arange(num_orig_images)
+    if max_num_images == -1 or num_orig_images <= max_num_images:
+        return image_paths, num_orig_images
 
-    image_filenames = list(np.array(image_paths)[idx])
+    image_filenames = [image_paths[i] for i in get_evenly_spaced_indices(num_orig_images, max_num_images)]
 
     return image_filenames, num_orig_images
 
 
+def get_num_ffmpeg_workers() -> int:
+    """Returns how many FFMPEG processes to run at once.
+
+    FFMPEG is multithreaded itself, so only use half the cores.
+
+    Returns:
+        The number of concurrent FFMPEG processes.
+    """
+    return max((os.cpu_count() or 1) // 2, 1)
+
+
 def get_num_frames_in_video(video: Path) -> int:
     """Returns the number of frames in a video.
 
@@ -91,14 +127,27 @@ def get_num_frames_in_video(video: Path) -> int:
     Returns:
         The number of frames in a video.
     """
-    cmd = f'ffprobe -v error -select_streams v:0 -count_packets \
-            -show_entries stream=nb_read_packets -of csv=p=0 "{video}"'
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-count_packets"]
+    cmd += ["-show_entries", "stream=nb_read_packets", "-of", "csv=p=0", str(video)]
     output = run_command(cmd)
     assert output is not None
     output = output.strip(" ,\t\n\r")
     return int(output)
 
 
+def count_frames(image_dir: Path, extension: str = ".jpg") -> int:
+    """Counts the extracted frames (frame_00001.jpg, frame_00002.jpg, etc.) in a directory.
+
+    Args:
+        image_dir: Path to the directory containing the frames.
+        extension: File extension of the frames.
+    Returns:
+        The number of frames.
+    """
+    with os.scandir(image_dir) as entries:
+        return sum(1 for entry in entries if entry.name.startswith("frame_") and entry.name.endswith(extension))
+
+
 def convert_video_to_images(
     video_path: Path, image_dir: Path, num_frames_target: int, verbose: bool = False
 ) -> Tuple[List[str], int]:
@@ -114,11 +163,9 @@ def convert_video_to_images(
     """
 
     with status(msg="Converting video to images...", spinner="bouncingBall", verbose=verbose):
-        # delete existing images in folder
-        for img in image_dir.glob("*.png"):
-            if verbose:
-                CONSOLE.log(f"Deleting {img}")
-            img.unlink()
+        # image_dir only holds the frames extracted from the video, so stale frames from a previous run can go.
+        shutil.rmtree(image_dir, ignore_errors=True)
+        image_dir.mkdir(parents=True, exist_ok=True)
 
         num_frames = get_num_frames_in_video(video_path)
         if num_frames == 0:
@@ -126,21 +173,22 @@ def convert_video_to_images(
             sys.exit(1)
         print("Number of frames in video:", num_frames)
 
-        out_filename = image_dir / "frame_%05d.png"
-        ffmpeg_cmd = f'ffmpeg -i "{video_path}"'
+        out_filename = image_dir / "frame_%05d.jpg"
+        ffmpeg_cmd = ["ffmpeg", "-y", "-i", str(video_path)]
         spacing = num_frames // num_frames_target
 
         if spacing > 1:
-            ffmpeg_cmd += f" -vf thumbnail={spacing},setpts=N/TB -r 1"
+            # Keep every spacing-th frame. Unlike thumbnail, select doesn't buffer and rank each window of frames.
+            ffmpeg_cmd += ["-vf", f"select=not(mod(n\\,{spacing})),setpts=N/TB", "-vsync", "vfr"]
         else:
             CONSOLE.print("[bold red]Can't satisfy requested number of frames. Extracting all frames.")
-            ffmpeg_cmd += " -pix_fmt bgr8"
 
-        ffmpeg_cmd += f" {out_filename}"
+        # High quality JPEG is much faster to write than PNG and is fine for feature matching.
+        ffmpeg_cmd += ["-q:v", "2", str(out_filename)]
 
         run_command(ffmpeg_cmd, verbose=verbose)
 
-    num_final_frames = len(list(image_dir.glob("*.png")))
+    num_final_frames = count_frames(image_dir)
     summary_log = []
     summary_log.append(f"Starting with {num_frames} video frames")
     summary_log.append(f"We extracted {num_final_frames} images")
@@ -149,40 +197,126 @@ def convert_video_to_images(
     return summary_log, num_final_frames
 
 
+def _is_up_to_date(image_path: Path, copied_image_path: Path, symlink: bool = False) -> bool:
+    """Checks if a previous run already linked the source image to the destination in the requested mode.
+
+    Copies are never treated as up to date, since a different image can share the size and modification time.
+
+    Args:
+        image_path: Path of the source image.
+        copied_image_path: Destination path.
+        symlink: If True, the destination must be a symlink, otherwise it must not be one.
+    Returns:
+        True if the destination is a link of the requested kind to the source.
+    """
+    try:
+        return copied_image_path.is_symlink() == symlink and os.path.samefile(image_path, copied_image_path)
+    except OSError:
+        return False
+
+
+def _unlink_if_exists(path: Path) -> None:
+    """Removes a file or symlink if it exists.
+
+    Args:
+        path: Path to remove.
+    """
+    # Can't use missing_ok argument because of Python 3.7 compatibility.
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _copy_and_crop(image_path: Path, copied_image_path: Path, crop_border_pixels: int, verbose: bool = False) -> None:
+    """Writes a cropped copy of an image with FFMPEG, never writing through an existing link at the destination.
+
+    Args:
+        image_path: Path of the image to copy.
+        copied_image_path: Destination path.
+        crop_border_pixels: Crops each edge by the specified number of pixels.
+        verbose: If True, logs the output of the command.
+    """
+    _unlink_if_exists(copied_image_path)
+    crop = f"crop=iw-{crop_border_pixels*2}:ih-{crop_border_pixels*2}"
+    # Several of these run at once, so keep ffmpeg away from the terminal with -nostdin.
+    ffmpeg_cmd = ["ffmpeg", "-nostdin", "-y", "-noautorotate", "-i", str(image_path)]
+    ffmpeg_cmd += ["-q:v", "2", "-vf", crop, str(copied_image_path)]
+    run_command(ffmpeg_cmd, verbose=verbose)
+
+
+def _link_or_copy(image_path: Path, copied_image_path: Path, symlink: bool = False) -> None:
+    """Places an image at a new path without duplicating its data when possible.
+
+    Hardlinks the image if source and destination are on the same filesystem, otherwise falls back to a copy
+    (which uses copy_file_range on Linux, so it can still be a reflink on filesystems that support it).
+    Images already linked by a previous run in the same mode are left untouched.
+
+    Args:
+        image_path: Path of the image to copy.
+        copied_image_path: Destination path.
+        symlink: If True, symlink to the source image instead.
+    """
+    if _is_up_to_date(image_path, copied_image_path, symlink):
+        return
+    _unlink_if_exists(copied_image_path)
+    if symlink:
+        os.symlink(image_path.absolute(), copied_image_path)
+        return
+    try:
+        os.link(image_path, copied_image_path)
+    except OSError:
+        shutil.copy2(image_path, copied_image_path)
+
+
 def copy_images_list(
-    image_paths: List[Path], image_dir: Path, crop_border_pixels: Optional[int] = None, verbose: bool = False
+    image_paths: List[Path],
+    image_dir: Path,
+    crop_border_pixels: Optional[int] = None,
+    symlink: bool = False,
+    verbose: bool = False,
 ) -> List[Path]:
     """Copy all images in a list of Paths. Useful for filtering from a directory.
     Args:
         image_paths: List of Paths of images to copy to a new directory.
         image_dir: Path to the output directory.
         crop_border_pixels: If not None, crops each edge by the specified number of pixels.
+        symlink: If True, symlink the images instead of copying them. Only use this if the source images won't be
+            modified. Ignored when cropping.
         verbose: If True, print extra logging.
     Returns:
         A list of the copied image Paths.
     """
 
-    # Remove original directory only if we provide a proper image folder path
-    if image_dir.is_dir() and len(image_paths):
-        shutil.rmtree(image_dir, ignore_errors=True)
-        image_dir.mkdir(exist_ok=True, parents=True)
-
-    copied_image_paths = []
-
     # Images should be 1-indexed for the rest of the pipeline.
-    for idx, image_path in enumerate(image_paths):
-        if verbose:
-            CONSOLE.log(f"Copying image {idx + 1} of {len(image_paths)}...")
-        copied_image_path = image_dir / f"frame_{idx + 1:05d}{image_path.suffix}"
-        shutil.copy(image_path, copied_image_path)
-        copied_image_paths.append(copied_image_path)
+    copied_image_paths = [
+        image_dir / f"frame_{idx + 1:05d}{image_path.suffix}" for idx, image_path in enumerate(image_paths)
+    ]
 
+    # Only remove leftovers from previous runs if we provide a proper image folder path. Images that will be
+    # written again are overwritten or reused in place.
+    if image_dir.is_dir() and len(image_paths):
+        target_names = {copied_image_path.name for copied_image_path in copied_image_paths}
+        for existing in image_dir.iterdir():
+            if existing.name in target_names:
+                continue
+            if existing.is_dir() and not existing.is_symlink():
+                shutil.rmtree(existing, ignore_errors=True)
+            else:
+                existing.unlink()
+
+    num_images = len(image_paths)
+    if verbose:
+        CONSOLE.log(f"Copying {num_images} images...")
     if crop_border_pixels is not None:
-        file_type = image_paths[0].suffix
-        filename = f"frame_%05d{file_type}"
-        crop = f"crop=iw-{crop_border_pixels*2}:ih-{crop_border_pixels*2}"
-        ffmpeg_cmd = f'ffmpeg -y -noautorotate -i "{image_dir / filename}" -q:v 2 -vf {crop} "{image_dir / filename}"'
-        run_command(ffmpeg_cmd, verbose=verbose)
+        # Crop while copying so every image is only decoded and encoded once.
+        crops = [crop_border_pixels] * num_images
+        with concurrent.futures.ThreadPoolExecutor(max_workers=get_num_ffmpeg_workers()) as executor:
+            list(executor.map(_copy_and_crop, image_paths, copied_image_paths, crops, [verbose] * num_images))
+    else:
+        # Copying is I/O bound, so overlap the per-file syscalls with a thread pool.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(_link_or_copy, image_paths, copied_image_paths, [symlink] * num_images))
 
     num_frames = len(image_paths)
 
@@ -219,36 +353,35 @@ def copy_and_upscale_polycam_depth_maps_list(
         assert upscale_factor > 1
         assert isinstance(upscale_factor, int)
 
-        copied_depth_map_paths = []
-        for idx, depth_map in enumerate(polycam_depth_image_filenames):
-            destination = depth_dir / f"frame_{idx + 1:05d}{depth_map.suffix}"
-            ffmpeg_cmd = [
-                f'ffmpeg -y -i "{depth_map}" ',
-                f"-q:v 2 -vf scale=iw*{upscale_factor}:ih*{upscale_factor}:flags=neighbor ",
-                f'"{destination}"',
-            ]
-            ffmpeg_cmd = " ".join(ffmpeg_cmd)
-            run_command(ffmpeg_cmd, verbose=verbose)
-            copied_depth_map_paths.append(destination)
-
-    if crop_border_pixels is not None:
-        file_type = depth_dir.glob("frame_*").__next__().suffix
-        filename = f"frame_%05d{file_type}"
-        crop = f"crop=iw-{crop_border_pixels * 2}:ih-{crop_border_pixels * 2}"
-        ffmpeg_cmd = f'ffmpeg -y -i "{depth_dir / filename}" -q:v 2 -vf {crop} "{depth_dir / filename}"'
-        run_command(ffmpeg_cmd, verbose=verbose)
+        copied_depth_map_paths = [
+            depth_dir / f"frame_{idx + 1:05d}{depth_map.suffix}"
+            for idx, depth_map in enumerate(polycam_depth_image_filenames)
+        ]
+        # Crop in the same pass as the upscale so every depth map is only decoded and encoded once.
+        vf_cmds = [f"scale=iw*{upscale_factor}:ih*{upscale_factor}:flags=neighbor"]
+        if crop_border_pixels is not None:
+            vf_cmds.append(f"crop=iw-{crop_border_pixels * 2}:ih-{crop_border_pixels * 2}")
+        ffmpeg_cmds = [
+            ["ffmpeg", "-nostdin", "-y", "-i", str(depth_map), "-q:v", "2", "-vf", ",".join(vf_cmds), str(destination)]
+            for depth_map, destination in zip(polycam_depth_image_filenames, copied_depth_map_paths)
+        ]
+        # Depth maps are independent. The commands use -nostdin so the concurrent processes don't fight over the
+        # terminal settings.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=get_num_ffmpeg_workers()) as executor:
+            list(executor.map(run_command, ffmpeg_cmds, [verbose] * len(ffmpeg_cmds)))
 
     CONSOLE.log("[bold green]:tada: Done upscaling depth maps.")
     return copied_depth_map_paths
 
 
-def copy_images(data: Path, image_dir: Path, verbose) -> int:
+def copy_images(data: Path, image_dir: Path, verbose, symlink: bool = False) -> int:
     """Copy images from a directory to a new directory.
 
     Args:
         data: Path to the directory of images.
         image_dir: Path to the output directory.
         verbose: If True, print extra logging.
+        symlink: If True, symlink the images instead of copying them.
     Returns:
         The number of images copied.
     """
@@ -259,13 +392,36 @@ def copy_images(data: Path, image_dir: Path, verbose) -> int:
             CONSOLE.log("[bold red]:skull: No usable images in the data folder.")
             sys.exit(1)
 
-        num_frames = len(copy_images_list(image_paths=image_paths, image_dir=image_dir, verbose=verbose))
+        num_frames = len(
+            copy_images_list(image_paths=image_paths, image_dir=image_dir, symlink=symlink, verbose=verbose)
+        )
 
     return num_frames
 
 
+def _run_downscale(image_path: Path, downscale_dirs: Dict[int, Path]) -> None:
+    """Downscales a single image by successive factors of two with an image pyramid.
+
+    The image is decoded once and each level is computed from the previous, smaller one.
+
+    Args:
+        image_path: Path to the image to downscale.
+        downscale_dirs: Mapping from downscale factor to the output directory for that factor, in increasing order.
+    """
+    # IMREAD_UNCHANGED keeps 16 bit depth maps intact and, like ffmpeg's -noautorotate, ignores EXIF orientation.
+    image = cv2.imread(str(image_path), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        CONSOLE.print(f"[bold red]Error: Could not read image: {image_path}")
+        sys.exit(1)
+    params = [cv2.IMWRITE_JPEG_QUALITY, 95] if image_path.suffix.lower() in (".jpg", ".jpeg") else []
+    for downscale_dir in downscale_dirs.values():
+        # Round sizes down like the ffmpeg scale filter and the mask downscales do.
+        image = cv2.pyrDown(image, dstsize=(image.shape[1] // 2, image.shape[0] // 2))
+        cv2.imwrite(str(downscale_dir / image_path.name), image, params)
+
+
 def downscale_images(image_dir: Path, num_downscales: int, folder_name: str = "images", verbose: bool = False) -> str:
-    """Downscales the images in the directory. Uses FFMPEG.
+    """Downscales the images in the directory. Uses OpenCV.
 
     Assumes images are named frame_00001.png, frame_00002.png, etc.
 
@@ -284,22 +440,20 @@ def downscale_images(image_dir: Path, num_downscales: int, folder_name: str = "i
 
     with status(msg="[bold yellow]Downscaling images...", spinner="growVertical", verbose=verbose):
         downscale_factors = [2**i for i in range(num_downscales + 1)[1:]]
+        downscale_dirs = {}
         for downscale_factor in downscale_factors:
             assert downscale_factor > 1
             assert isinstance(downscale_factor, int)
             downscale_dir = image_dir.parent / f"{folder_name}_{downscale_factor}"
             downscale_dir.mkdir(parents=True, exist_ok=True)
-            # Using %05d ffmpeg commands appears to be unreliable (skips images), so use scandir.
-            files = os.scandir(image_dir)
-            for f in files:
-                filename = f.name
-                ffmpeg_cmd = [
-                    f'ffmpeg -y -noautorotate -i "{image_dir / filename}" ',
-                    f"-q:v 2 -vf scale=iw/{downscale_factor}:ih/{downscale_factor} ",
-                    f'"{downscale_dir / filename}"',
-                ]
-                ffmpeg_cmd = " ".join(ffmpeg_cmd)
-                run_command(ffmpeg_cmd, verbose=verbose)
+            downscale_dirs[downscale_factor] = downscale_dir
+        image_paths = [Path(f.path) for f in os.scandir(image_dir)]
+        # Images are independent and OpenCV releases the GIL while decoding, resizing and encoding.
+        max_workers = max(min(len(image_paths), os.cpu_count() or 1), 1)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_run_downscale, image_path, downscale_dirs) for image_path in image_paths]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
 
     CONSOLE.log("[bold green]:tada: Done downscaling images.")
     downscale_text = [f"[bold blue]{2**(i+1)}x[/bold blue]" for i in range(num_downscales)]
@@ -14,11 +14,11 @@
 
 """Helper functions for processing record3d data."""
 
-import json
 from pathlib import Path
 from typing import List
 
 import numpy as np
+import orjson
 from rich.console import Console
 from scipy.spatial.transform import Rotation
 
@@ -28,11 +28,11 @@ from nerfstudio.utils import io
 CONSOLE = Console(width=120)
 
 
-def record3d_to_json(images_paths: List[Path], metadata_path: Path, output_dir: Path, indices: np.ndarray) -> int:
+def record3d_to_json(images_paths: List[str], metadata_path: Path, output_dir: Path, indices: np.ndarray) -> int:
     """Converts Record3D's metadata and image paths to a JSON file.
 
     Args:
-        images_paths: list if image paths.
+        images_paths: list if image paths, relative to output_dir.
         metadata_path: Path to the Record3D metadata JSON file.
         output_dir: Path to the output directory.
         indices: Indices to sample the metadata_path. Should be the same length as images_paths.
@@ -56,14 +56,8 @@ def record3d_to_json(images_paths: List[Path], metadata_path: Path, output_dir:
     homogeneous_coord[..., :, 3] = 1
     camera_to_worlds = np.concatenate([camera_to_worlds, homogeneous_coord], -2)
 
-    frames = []
-    for i, im_path in enumerate(images_paths):
-        c2w = camera_to_worlds[i]
-        frame = {
-            "file_path": im_path.as_posix(),
-            "transform_matrix": c2w.tolist(),
-        }
-        frames.append(frame)
+    # The matrices stay as ndarray views, orjson serializes them without going through Python lists.
+    frames = [{"file_path": im_path, "transform_matrix": c2w} for im_path, c2w in zip(images_paths, camera_to_worlds)]
 
     # Camera intrinsics
     K = np.array(metadata_dict["K"]).reshape((3, 3)).T
@@ -88,7 +82,8 @@ def record3d_to_json(images_paths: List[Path], metadata_path: Path, output_dir:
 
     out["frames"] = frames
 
-    with open(output_dir / "transforms.json", "w", encoding="utf-8") as f:
-        json.dump(out, f, indent=4)
+    (output_dir / "transforms.json").write_bytes(
+        orjson.dumps(out, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2)
+    )
 
     return len(frames)
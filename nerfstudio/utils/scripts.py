@@ -15,26 +15,26 @@
 
 import subprocess
 import sys
-from typing import Optional
+from typing import List, Optional, Union
 
 from rich.console import Console
 
 CONSOLE = Console(width=120)
 
 
-def run_command(cmd: str, verbose=False) -> Optional[str]:
+def run_command(cmd: Union[str, List[str]], verbose=False) -> Optional[str]:
     """Runs a command and returns the output.
 
     Args:
-        cmd: Command to run.
+        cmd: Command to run. A string is run through the shell, a list of arguments is executed directly.
         verbose: If True, logs the output of the command.
     Returns:
         The output of the command if return_output is True, otherwise None.
     """
-    out = subprocess.run(cmd, capture_output=not verbose, shell=True, check=False)
+    out = subprocess.run(cmd, capture_output=not verbose, shell=isinstance(cmd, str), check=False)
     if out.returncode != 0:
         CONSOLE.rule("[bold red] :skull: :skull: :skull: ERROR :skull: :skull: :skull: ", style="red")
-        CONSOLE.print(f"[bold red]Error running command: {cmd}")
+        CONSOLE.print(f"[bold red]Error running command: {cmd if isinstance(cmd, str) else ' '.join(cmd)}")
         CONSOLE.rule(style="red")
         CONSOLE.print(out.stderr.decode("utf-8"))
         sys.exit(1)
@@ -3,6 +3,7 @@
 
 
 import json
+import os
 import shutil
 import sys
 import zipfile
@@ -79,12 +80,18 @@ class ProcessImages:
     """If True, skips COLMAP and generates transforms.json if possible."""
     skip_image_processing: bool = False
     """If True, skips copying and downscaling of images and only runs COLMAP if possible and enabled"""
+    symlink: bool = False
+    """If True, symlinks the input images into the output directory instead of copying them. Only use this if the
+       input images won't be modified or moved."""
     colmap_model_path: Path = DEFAULT_COLMAP_PATH
     """Optionally sets the path of the colmap model. Used only when --skip-colmap is set to True.
        The path is relative to the output directory.
     """
     colmap_cmd: str = "colmap"
     """How to call the COLMAP executable."""
+    use_colmap_cache: bool = False
+    """If True, reuses the COLMAP reconstruction of a previous run on identical images and settings. Results are
+       cached in the user cache directory."""
     images_per_equirect: Literal[8, 14] = 8
     """Number of samples per image to take from each equirectangular image.
        Used only when camera-type is equirectangular.
@@ -96,6 +103,7 @@ class ProcessImages:
 
     def main(self) -> None:
         """Process images into a nerfstudio dataset."""
+        camera_model = CAMERA_MODELS[self.camera_type]
         require_cameras_exist = False
         colmap_model_path = self.output_dir / Path(self.colmap_model_path)
         if self.colmap_model_path != DEFAULT_COLMAP_PATH:
@@ -129,7 +137,9 @@ class ProcessImages:
         # Copy and downscale images
         if not self.skip_image_processing:
             # Copy images to output directory
-            num_frames = process_data_utils.copy_images(self.data, image_dir=image_dir, verbose=self.verbose)
+            num_frames = process_data_utils.copy_images(
+                self.data, image_dir=image_dir, verbose=self.verbose, symlink=self.symlink
+            )
             summary_log.append(f"Starting with {num_frames} images")
 
             # Downscale images
@@ -150,7 +160,7 @@ class ProcessImages:
             colmap_model_path = colmap_dir / "sparse" / "0"
             require_cameras_exist = True
 
-            self._run_colmap(image_dir, colmap_dir)
+            self._run_colmap(image_dir, colmap_dir, camera_model)
 
         # Save transforms.json
         if (colmap_model_path / "cameras.bin").exists():
@@ -159,7 +169,7 @@ class ProcessImages:
                     cameras_path=colmap_model_path / "cameras.bin",
                     images_path=colmap_model_path / "images.bin",
                     output_dir=self.output_dir,
-                    camera_model=CAMERA_MODELS[self.camera_type],
+                    camera_model=camera_model,
                 )
                 summary_log.append(f"Colmap matched {num_matched_frames} images")
             summary_log.append(colmap_utils.get_matching_summary(num_frames, num_matched_frames))
@@ -175,7 +185,7 @@ class ProcessImages:
             CONSOLE.print(summary, justify="center")
         CONSOLE.rule()
 
-    def _run_colmap(self, image_dir, colmap_dir):
+    def _run_colmap(self, image_dir, colmap_dir, camera_model):
         (sfm_tool, feature_type, matcher_type) = process_data_utils.find_tool_feature_matcher_combination(
             self.sfm_tool, self.feature_type, self.matcher_type
         )
@@ -184,17 +194,18 @@ class ProcessImages:
             colmap_utils.run_colmap(
                 image_dir=image_dir,
                 colmap_dir=colmap_dir,
-                camera_model=CAMERA_MODELS[self.camera_type],
+                camera_model=camera_model,
                 gpu=self.gpu,
                 verbose=self.verbose,
                 matching_method=self.matching_method,
                 colmap_cmd=self.colmap_cmd,
+                use_cache=self.use_colmap_cache,
             )
         elif sfm_tool == "hloc":
             hloc_utils.run_hloc(
                 image_dir=image_dir,
                 colmap_dir=colmap_dir,
-                camera_model=CAMERA_MODELS[self.camera_type],
+                camera_model=camera_model,
                 verbose=self.verbose,
                 matching_method=self.matching_method,
                 feature_type=feature_type,
@@ -254,6 +265,9 @@ class ProcessVideo:
     """If True, skips COLMAP and generates transforms.json if possible."""
     colmap_cmd: str = "colmap"
     """How to call the COLMAP executable."""
+    use_colmap_cache: bool = False
+    """If True, reuses the COLMAP reconstruction of a previous run on identical images and settings. Results are
+       cached in the user cache directory."""
     images_per_equirect: Literal[8, 14] = 8
     """Number of samples per image to take from each equirectangular image.
        Used only when camera-type is equirectangular.
@@ -269,6 +283,7 @@ class ProcessVideo:
 
     def main(self) -> None:
         """Process video into a nerfstudio dataset."""
+        camera_model = CAMERA_MODELS[self.camera_type]
         install_checks.check_ffmpeg_installed()
         install_checks.check_colmap_installed()
 
@@ -336,12 +351,13 @@ class ProcessVideo:
                 colmap_utils.run_colmap(
                     image_dir=image_dir,
                     colmap_dir=colmap_dir,
-                    camera_model=CAMERA_MODELS[self.camera_type],
+                    camera_model=camera_model,
                     camera_mask_path=mask_path,
                     gpu=self.gpu,
                     verbose=self.verbose,
                     matching_method=self.matching_method,
                     colmap_cmd=self.colmap_cmd,
+                    use_cache=self.use_colmap_cache,
                 )
             elif sfm_tool == "hloc":
                 if mask_path is not None:
@@ -352,7 +368,7 @@ class ProcessVideo:
                 hloc_utils.run_hloc(
                     image_dir=image_dir,
                     colmap_dir=colmap_dir,
-                    camera_model=CAMERA_MODELS[self.camera_type],
+                    camera_model=camera_model,
                     verbose=self.verbose,
                     matching_method=self.matching_method,
                     feature_type=feature_type,
@@ -369,7 +385,7 @@ class ProcessVideo:
                     cameras_path=colmap_dir / "sparse" / "0" / "cameras.bin",
                     images_path=colmap_dir / "sparse" / "0" / "images.bin",
                     output_dir=self.output_dir,
-                    camera_model=CAMERA_MODELS[self.camera_type],
+                    camera_model=camera_model,
                     camera_mask_path=mask_path,
                 )
                 summary_log.append(f"Colmap matched {num_matched_frames} images")
@@ -415,6 +431,9 @@ class ProcessInsta360:
     """If True, skips COLMAP and generates transforms.json if possible."""
     colmap_cmd: str = "colmap"
     """How to call the COLMAP executable."""
+    use_colmap_cache: bool = False
+    """If True, reuses the COLMAP reconstruction of a previous run on identical images and settings. Results are
+       cached in the user cache directory."""
     gpu: bool = True
     """If True, use GPU."""
     verbose: bool = False
@@ -422,6 +441,7 @@ class ProcessInsta360:
 
     def main(self) -> None:
         """Process video into a nerfstudio dataset."""
+        camera_model = CAMERA_MODELS["fisheye"]
         install_checks.check_ffmpeg_installed()
         install_checks.check_colmap_installed()
 
@@ -434,7 +454,8 @@ class ProcessInsta360:
         if not filename_back.exists():
             raise FileNotFoundError(f"Could not find {filename_back}")
 
-        ffprobe_cmd = f'ffprobe -v quiet -print_format json -show_streams -select_streams v:0 "{filename_back}"'
+        ffprobe_cmd = ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_streams", "-select_streams", "v:0"]
+        ffprobe_cmd.append(str(filename_back))
 
         ffprobe_output = process_data_utils.run_command(ffprobe_cmd)
 
@@ -475,11 +496,12 @@ class ProcessInsta360:
             colmap_utils.run_colmap(
                 image_dir=image_dir,
                 colmap_dir=colmap_dir,
-                camera_model=CAMERA_MODELS["fisheye"],
+                camera_model=camera_model,
                 gpu=self.gpu,
                 verbose=self.verbose,
                 matching_method=self.matching_method,
                 colmap_cmd=self.colmap_cmd,
+                use_cache=self.use_colmap_cache,
             )
 
         # Save transforms.json
@@ -489,7 +511,7 @@ class ProcessInsta360:
                     cameras_path=colmap_dir / "sparse" / "0" / "cameras.bin",
                     images_path=colmap_dir / "sparse" / "0" / "images.bin",
                     output_dir=self.output_dir,
-                    camera_model=CAMERA_MODELS["fisheye"],
+                    camera_model=camera_model,
                 )
                 summary_log.append(f"Colmap matched {num_matched_frames} images")
             summary_log.append(colmap_utils.get_matching_summary(num_extracted_frames, num_matched_frames))
@@ -541,26 +563,32 @@ class ProcessRecord3D:
         if not record3d_image_dir.exists():
             raise ValueError(f"Image directory {record3d_image_dir} doesn't exist")
 
-        record3d_image_filenames = []
-        for f in record3d_image_dir.iterdir():
-            if f.stem.isdigit():  # removes possible duplicate images (for example, 123(3).jpg)
-                if f.suffix.lower() in [".jpg", ".jpeg", ".png", ".tif", ".tiff"]:
-                    record3d_image_filenames.append(f)
-
-        record3d_image_filenames = sorted(record3d_image_filenames, key=lambda fn: int(fn.stem))
+        # Parse each frame number once and sort on it. Non-numeric stems are possible duplicate images
+        # (for example, 123(3).jpg), so they are skipped.
+        with os.scandir(record3d_image_dir) as entries:
+            split_names = [(os.path.splitext(entry.name), entry.path) for entry in entries]
+        numbered_image_filenames = [
+            (int(stem), Path(path))
+            for (stem, ext), path in split_names
+            if stem.isdigit() and ext.lower() in process_data_utils.ALLOWED_EXTS
+        ]
+        numbered_image_filenames.sort()
+        record3d_image_filenames = [f for _, f in numbered_image_filenames]
         num_images = len(record3d_image_filenames)
-        idx = np.arange(num_images)
         if self.max_dataset_size != -1 and num_images > self.max_dataset_size:
-            idx = np.round(np.linspace(0, num_images - 1, self.max_dataset_size)).astype(int)
+            idx = process_data_utils.get_evenly_spaced_indices(num_images, self.max_dataset_size)
+            record3d_image_filenames = [record3d_image_filenames[i] for i in idx]
+        else:
+            # Still needed to index the Record3D metadata.
+            idx = np.arange(num_images)
 
-        record3d_image_filenames = list(np.array(record3d_image_filenames)[idx])
         # Copy images to output directory
         copied_image_paths = process_data_utils.copy_images_list(
             record3d_image_filenames, image_dir=image_dir, verbose=self.verbose
         )
         num_frames = len(copied_image_paths)
 
-        copied_image_paths = [Path("images/" + copied_image_path.name) for copied_image_path in copied_image_paths]
+        copied_image_paths = [f"images/{copied_image_path.name}" for copied_image_path in copied_image_paths]
         summary_log.append(f"Used {num_frames} images out of {num_images} total")
         if self.max_dataset_size > 0:
             summary_log.append(
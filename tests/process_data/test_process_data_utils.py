@@ -0,0 +1,35 @@
+"""
+Test process data utils
+"""
+
+import numpy as np
+
+from nerfstudio.process_data.process_data_utils import get_evenly_spaced_indices
+
+
+def test_evenly_spaced_indices_match_linspace():
+    """Test that the indices match rounding np.linspace away from exact halves."""
+    for num_items in range(1, 100):
+        for num_samples in range(2, num_items + 1):
+            indices = get_evenly_spaced_indices(num_items, num_samples)
+            expected = np.round(np.linspace(0, num_items - 1, num_samples)).astype(int)
+            # Exact halves are where linspace's floating point error decides the rounding direction.
+            exact_half = (2 * np.arange(num_samples) * (num_items - 1)) % (2 * (num_samples - 1)) == num_samples - 1
+            assert indices.dtype == np.int64
+            assert np.array_equal(indices[~exact_half], expected[~exact_half])
+
+
+def test_evenly_spaced_indices_round_half_to_even():
+    """Test that exact halves round to the even index."""
+    assert get_evenly_spaced_indices(4, 3).tolist() == [0, 2, 3]
+    assert get_evenly_spaced_indices(6, 3).tolist() == [0, 2, 5]
+
+
+def test_evenly_spaced_indices_single_sample():
+    """Test that a single sample returns the first index."""
+    assert get_evenly_spaced_indices(10, 1).tolist() == [0]
+
+
+def test_evenly_spaced_indices_no_samples():
+    """Test that zero samples returns no indices."""
+    assert get_evenly_spaced_indices(10, 0).tolist() == []